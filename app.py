@@ -1,5 +1,7 @@
 import uvicorn
 from utils.models import Models
+from utils.logs import log_uploader
+from utils.embeddings import EmbeddingStore
 from audioEmotions import AudioEmotions
 from fastapi import FastAPI, HTTPException
 
@@ -17,30 +19,69 @@ def health():
     return {"status": "ok"}
 
 
+@app.on_event("shutdown")
+def shutdown():
+    """
+    Waits for the pending log uploads before the application stops.
+    """
+    log_uploader.close()
+
+
 @app.post("/analyse_audio")
-async def process_audio(session_id: int, interview_id: int):
+async def process_audio(session_id: int, interview_id: int, embeddings: bool = False):
     """
     Processes an audio file to analyze emotions.
     Parameters:
         session_id (int): The session ID related to the audio file.
         interview_id (int): The interview ID of the audio file.
+        embeddings (bool): Whether to also store the pooled embedding of each segment in the local embedding store.
     Returns:
         dict: Status message indicating the outcome of the operation.
     Raises:
         HTTPException: An exception with status code 500 if processing fails.
     """
-    ate = AudioEmotions(session_id=session_id,
-                        interview_id=interview_id)
+    ate = None
     try:
-        segments = ate.utils.get_segments_from_db()
-        segments['audio_emotions'] = ate.split_and_predict(segments)
-        ate.utils.update_results(segments)
+        ate = AudioEmotions(session_id=session_id,
+                            interview_id=interview_id)
+        with ate.utils.stage('get_segments'):
+            segments = ate.utils.get_segments_from_db()
+        with ate.utils.stage('split_and_predict'):
+            segments['audio_emotions'], segment_embeddings = ate.split_and_predict(segments,
+                                                                                   return_embeddings=embeddings)
+        with ate.utils.stage('update_results'):
+            ate.utils.update_results(segments)
+        if segment_embeddings is not None:
+            with ate.utils.stage('save_embeddings'):
+                ate.save_embeddings(segments.index, segment_embeddings)
         return {"status": "ok"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     finally:
-        ate.utils.end_log()
-        ate.utils.__del__()
+        if ate is not None:
+            ate.utils.end_log()
+
+
+@app.get("/similar_segments")
+def similar_segments(session_id: int, interview_id: int, results_id: int, k: int = 5):
+    """
+    Searches the segments of an interview most similar to a given segment, using the embeddings stored by
+    /analyse_audio with embeddings enabled.
+    Parameters:
+        session_id (int): The session ID of the interview.
+        interview_id (int): The interview ID of the interview.
+        results_id (int): The results id of the segment to compare with.
+        k (int): The maximum number of segments to return.
+    Returns:
+        dict: The ids and cosine similarity scores of the most similar segments, in descending order.
+    Raises:
+        HTTPException: An exception with status code 404 if no embedding is stored for the segment.
+    """
+    store = EmbeddingStore(models.get_data_folder('EMBEDDINGS'), models.ate_model_id, session_id, interview_id)
+    try:
+        return {"results_id": results_id, "similar": store.top_k(results_id, k)}
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=e.args[0])
 
 
 if __name__ == "__main__":
@@ -1,13 +1,17 @@
 import io
 import torch
+import threading
 import torchaudio
+import numpy as np
 import pandas as pd
-from typing import Dict, List
+from typing import Dict, List, Tuple
 from utils.utils import Utils
 from dotenv import load_dotenv
 from pydub import AudioSegment
 from utils.models import Models
 import torch.nn.functional as f
+from utils.features import FeatureCache
+from utils.embeddings import EmbeddingStore
 
 
 class AudioEmotions:
@@ -23,64 +27,198 @@ class AudioEmotions:
         # Load environment variables from .env file
         load_dotenv()
         self.utils = Utils(session_id, interview_id)
-        self.models = Models()
+        try:
+            self.models = Models()
+            self.feature_cache = self.__init_feature_cache()
+        except Exception as e:
+            # The caller never gets the instance, so the log of the request is released here
+            self.utils.log.error('Error initializing AudioEmotions : {}'.format(str(e)))
+            self.utils.end_log()
+            raise e
 
-    def split_and_predict(self, segments: pd.DataFrame) -> List[Dict[str, float]]:
+    def __init_feature_cache(self) -> FeatureCache | None:
         """
-        Splits the audio file into segments and predicts emotions for each segment using a deep learning model.
+        Initializes the feature cache of the interview if it is enabled in the configuration.
+        Returns:
+            FeatureCache | None: The feature cache of the interview, or None if it is disabled.
+        """
+        config = self.utils.config
+        if not config.has_section('FEATURECACHE') or not config['FEATURECACHE'].getboolean('Enabled'):
+            return None
+        return FeatureCache(self.models.get_data_folder('FEATURECACHE'),
+                            self.models.ate_feature_extractor,
+                            self.utils.session_id,
+                            self.utils.interview_id)
+
+    def __load_audio(self) -> AudioSegment:
+        """
+        Downloads and decodes the audio file of the interview.
+        Returns:
+            AudioSegment: The decoded audio file.
+        """
+        filename = self.utils.config['GENERAL']['Audioname']
+        s3_path = '{}/{}/raw/{}'.format(self.utils.session_id, self.utils.interview_id, filename)
+        with self.utils.stage('load_audio'):
+            audio_bytes = self.utils.open_input_file(s3_path, filename)
+            return AudioSegment.from_file(io.BytesIO(audio_bytes), format="mp3")
+
+    def __extract_features(self, audio_segment: AudioSegment) -> np.ndarray:
+        """
+        Resamples an audio segment and normalizes it with the feature extractor.
         Parameters:
-            segments (pd.DataFrame): DataFrame containing the start and end times of audio segments.
+            audio_segment (AudioSegment): The audio segment to process.
         Returns:
-            List[Dict[str, float]]: A list of dictionaries with emotion labels and their respective scores.
-        Raises:
-            Exception: If an error occurs during prediction, logs and raises an exception.
+            np.ndarray: The one-dimensional normalized input features of the segment.
         """
-        sentiments = list()
+        audio_segment_bytes = io.BytesIO()
+        audio_segment.export(audio_segment_bytes, format="wav")
+        audio_segment_bytes.seek(0)
+
+        speech_array, sample_rate = torchaudio.load(audio_segment_bytes)
+        resampler = torchaudio.transforms.Resample(sample_rate, self.models.ate_sampling_rate)
+        speech = resampler(speech_array).squeeze().numpy()
+
+        inputs = self.models.ate_feature_extractor(speech,
+                                                   sampling_rate=self.models.ate_sampling_rate,
+                                                   return_tensors="np",
+                                                   padding=True)
+        return inputs['input_values'][0]
+
+    def __predict(self, features: np.ndarray,
+                  return_embedding: bool = False) -> Tuple[Dict[str, float], np.ndarray | None]:
+        """
+        Predicts the emotions of a segment from its normalized input features.
+        Parameters:
+            features (np.ndarray): The one-dimensional normalized input features of the segment.
+            return_embedding (bool): Whether to also return the pooled hidden-state embedding of the segment.
+        Returns:
+            Tuple[Dict[str, float], np.ndarray | None]: A dictionary with emotion labels and their respective scores,
+                                                        and the float16 embedding of the segment if requested.
+        """
+        input_values = torch.from_numpy(features).unsqueeze(0)
+        inputs = {'input_values': input_values}
+        if self.models.ate_feature_extractor.return_attention_mask:
+            inputs['attention_mask'] = torch.ones(input_values.shape, dtype=torch.int32)
 
-        try:
-            filename = self.utils.config['GENERAL']['Audioname']
-            self.utils.log.info('Recognizing emotions from audio file')
-            s3_path = '{}/{}/raw/{}'.format(self.utils.session_id, self.utils.interview_id, filename)
-            audio_bytes = self.utils.open_input_file(s3_path, filename)
-            audio = AudioSegment.from_file(io.BytesIO(audio_bytes), format="mp3")
+        inputs = {key: inputs[key].to(self.models.device) for key in inputs}
 
-            for row in segments.itertuples():
-                audio_segment = audio[row.start:row.end]
-                audio_segment_bytes = io.BytesIO()
-                audio_segment.export(audio_segment_bytes, format="wav")
-                audio_segment_bytes.seek(0)
+        hidden_states = dict()
+        thread_id = threading.get_ident()
+
+        def keep_last_hidden_state(module: torch.nn.Module, args: Tuple, output: Tuple) -> None:
+            # The model is shared, so forward passes of other threads are ignored
+            if threading.get_ident() == thread_id:
+                hidden_states['last'] = output[0]
+
+        # Unlike output_hidden_states, the hook keeps only the last hidden state instead of every layer
+        hook = None
+        if return_embedding:
+            hook = self.models.ate_model.base_model.register_forward_hook(keep_last_hidden_state)
 
-                speech_array, sample_rate = torchaudio.load(audio_segment_bytes)
-                resampler = torchaudio.transforms.Resample(sample_rate, self.models.ate_sampling_rate)
-                speech = resampler(speech_array).squeeze().numpy()
+        try:
+            with torch.no_grad():
+                logits = self.models.ate_model(**inputs).logits
+        finally:
+            if hook is not None:
+                hook.remove()
 
-                inputs = self.models.ate_feature_extractor(speech,
-                                                           sampling_rate=self.models.ate_sampling_rate,
-                                                           return_tensors="pt",
-                                                           padding=True)
+        embedding = None
+        if return_embedding:
+            # Mean-pool the last hidden state over time, from the same forward pass as the emotions
+            embedding = hidden_states['last'].mean(dim=1)[0].cpu().numpy().astype(np.float16)
 
-                inputs = {key: inputs[key].to(self.models.device) for key in inputs}
+        scores = f.softmax(logits, dim=1).detach().cpu().numpy()[0]
 
-                with torch.no_grad():
-                    logits = self.models.ate_model(**inputs).logits
+        # Get the percentage scores and round them to 5 decimal places
+        scores = [round(num * 100, 5) for num in scores]
 
-                scores = f.softmax(logits, dim=1).detach().cpu().numpy()[0]
+        # Get a dictionary with the labels for each emotion and its values
+        values_dict = dict(zip(self.models.ate_model.config.id2label.values(), scores))
 
-                # Get the percentage scores and round them to 5 decimal places
-                scores = [round(num * 100, 5) for num in scores]
+        # Sort the dictionary by values in descending order
+        sorted_values = {k: v for k, v in sorted(values_dict.items(), key=lambda x: x[1], reverse=True)}
 
-                # Get a dictionary with the labels for each emotion and its values
-                values_dict = dict(zip(self.models.ate_model.config.id2label.values(), scores))
+        return self.utils.adjust_values(sorted_values), embedding
 
-                # Sort the dictionary by values in descending order
-                sorted_values = {k: v for k, v in sorted(values_dict.items(), key=lambda x: x[1], reverse=True)}
+    def split_and_predict(self, segments: pd.DataFrame, return_embeddings: bool = False
+                          ) -> Tuple[List[Dict[str, float]], np.ndarray | None]:
+        """
+        Splits the audio file into segments and predicts emotions for each segment using a deep learning model.
+        When the feature cache is enabled, the stored features of a segment are used instead of decoding,
+        resampling and normalizing it again, and the features of the other segments are stored for later runs.
+        Predictions always use the float16 precision of the stored features, whether or not they were cached.
+        Parameters:
+            segments (pd.DataFrame): DataFrame containing the start and end times of audio segments.
+            return_embeddings (bool): Whether to also return the pooled hidden-state embedding of each segment,
+                                      computed in the same forward pass as its emotions.
+        Returns:
+            Tuple[List[Dict[str, float]], np.ndarray | None]: A list of dictionaries with emotion labels and their
+                                                              respective scores, and a float16 matrix with one
+                                                              embedding per segment if return_embeddings is True.
+        Raises:
+            Exception: If an error occurs during prediction, logs and raises an exception.
+        """
+        sentiments = list()
+        embeddings = list()
 
-                adjusted_values = self.utils.adjust_values(sorted_values)
+        try:
+            self.utils.log.info('Recognizing emotions from audio file')
+            audio = None
+            cached = 0
 
-                sentiments.append(adjusted_values)
+            for row in segments.itertuples():
+                features = None
+                if self.feature_cache is not None:
+                    features = self.feature_cache.get(row.Index, row.start, row.end)
+
+                if features is None:
+                    # The audio file is only downloaded and decoded if a segment is missing from the cache
+                    if audio is None:
+                        audio = self.__load_audio()
+                    features = self.__extract_features(audio[row.start:row.end])
+                    if self.feature_cache is not None:
+                        self.feature_cache.put(row.Index, row.start, row.end, features)
+                        # Predict from the features as they are stored, so that later cache hits give the same scores
+                        features = features.astype(np.float16).astype(np.float32)
+                else:
+                    cached += 1
+
+                sentiment, embedding = self.__predict(features, return_embeddings)
+                sentiments.append(sentiment)
+                embeddings.append(embedding)
+
+            if self.feature_cache is not None:
+                self.utils.log.info('{} of {} segments read from the feature cache'.format(cached, len(segments)))
+                try:
+                    self.feature_cache.save()
+                except Exception as e:
+                    # The predictions are still valid, only the next run will have to compute the features again
+                    self.utils.log.error(('Error saving the features to the feature cache.', str(e)))
         except Exception as e:
             message = ('Error splitting and predicting the emotions from the audio file.', str(e))
             self.utils.log.error(message)
             raise e
 
-        return sentiments
+        if not return_embeddings:
+            return sentiments, None
+        if len(embeddings) == 0:
+            return sentiments, np.empty((0, self.models.ate_model.config.hidden_size), dtype=np.float16)
+        return sentiments, np.stack(embeddings)
+
+    def save_embeddings(self, ids: pd.Index, embeddings: np.ndarray) -> None:
+        """
+        Stores the embeddings of the segments of the interview in the local embedding store.
+        Errors are logged and ignored, as for the feature cache: the emotions of the segments are still valid.
+        Parameters:
+            ids (pd.Index): The results ids of the segments.
+            embeddings (np.ndarray): The embeddings of the segments, one row per id.
+        """
+        try:
+            store = EmbeddingStore(self.models.get_data_folder('EMBEDDINGS'),
+                                   self.models.ate_model_id,
+                                   self.utils.session_id,
+                                   self.utils.interview_id)
+            store.save(ids, embeddings)
+            self.utils.log.info('{} segment embeddings saved'.format(len(embeddings)))
+        except Exception as e:
+            self.utils.log.error(('Error saving the segment embeddings.', str(e)))
@@ -146,3 +146,13 @@ def system_test(c):  # noqa: ANN001, ANN201
     """Run system tests"""
     with c.prefix(venv):
         c.run("pytest test/test_system.py")
+
+
+@task(pre=[require_venv_test])
+def load_test(c, mix="mixed", concurrency=4, requests=40, output="load_test.json"):  # noqa: ANN001, ANN201
+    """Run the load test against a local fake of Supabase and a tiny random-weight model"""
+    with c.prefix(venv):
+        c.run(
+            "python -m test.load.run "
+            f"--mix {mix} --concurrency {concurrency} --requests {requests} --output {output}"
+        )
@@ -12,18 +12,24 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import flask
-from flask.testing import FlaskClient
+from typing import TYPE_CHECKING
+
 import pytest
 
-from app import app as flask_app
+if TYPE_CHECKING:
+    import flask
+    from flask.testing import FlaskClient
 
 
+# The application is imported by the fixtures rather than at module level, so that the unit tests which do not
+# need it can be collected without loading the models.
 @pytest.fixture
 def app() -> None:
+    from app import app as flask_app
+
     yield flask_app
 
 
 @pytest.fixture
-def client(app: flask.app.Flask) -> FlaskClient:
+def client(app: "flask.app.Flask") -> "FlaskClient":
     return app.test_client()
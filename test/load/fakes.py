@@ -0,0 +1,154 @@
+import time
+import threading
+from typing import Any, Dict, List
+
+
+class FakeResponse:
+    """
+    Minimal stand-in for the response of a Supabase query.
+    Attributes:
+        data (List[Dict[str, Any]]): The rows returned by the query.
+    """
+    def __init__(self, data: List[Dict[str, Any]]) -> None:
+        self.data = data
+
+
+class FakeQuery:
+    """
+    In-process stand-in for the Supabase query builder, supporting the select, update and eq calls used by Utils.
+    """
+    def __init__(self, table: 'FakeTable') -> None:
+        """
+        Initializes a query on a table.
+        Parameters:
+            table (FakeTable): The table to query.
+        """
+        self.table = table
+        self.columns = None
+        self.values = None
+        self.filters = list()
+
+    def select(self, *columns: str) -> 'FakeQuery':
+        self.columns = columns
+        return self
+
+    def update(self, values: Dict[str, Any]) -> 'FakeQuery':
+        self.values = values
+        return self
+
+    def eq(self, column: str, value: Any) -> 'FakeQuery':
+        self.filters.append((column, value))
+        return self
+
+    def execute(self) -> FakeResponse:
+        """
+        Runs the query against the rows of the table.
+        Returns:
+            FakeResponse: The selected or updated rows.
+        """
+        return self.table.execute(self)
+
+
+class FakeTable:
+    """
+    In-process stand-in for a Supabase table, holding its rows in memory.
+    Attributes:
+        rows (List[Dict[str, Any]]): The rows of the table.
+    """
+    def __init__(self, rows: List[Dict[str, Any]], latency: float) -> None:
+        """
+        Initializes the table.
+        Parameters:
+            rows (List[Dict[str, Any]]): The initial rows of the table.
+            latency (float): The simulated network latency of each query, in seconds.
+        """
+        self.rows = rows
+        self.latency = latency
+        self.lock = threading.Lock()
+
+    def execute(self, query: FakeQuery) -> FakeResponse:
+        """
+        Runs a query against the rows of the table.
+        Parameters:
+            query (FakeQuery): The query to run.
+        Returns:
+            FakeResponse: The selected or updated rows.
+        """
+        time.sleep(self.latency)
+        with self.lock:
+            rows = [row for row in self.rows if all(row.get(column) == value for column, value in query.filters)]
+            if query.values is not None:
+                for row in rows:
+                    row.update(query.values)
+                return FakeResponse([dict(row) for row in rows])
+            return FakeResponse([{column: row[column] for column in query.columns} for row in rows])
+
+
+class FakeBucket:
+    """
+    In-process stand-in for a Supabase storage bucket, holding its files in memory.
+    Attributes:
+        files (Dict[str, bytes]): The content of the files, keyed by path.
+    """
+    def __init__(self, files: Dict[str, bytes], latency: float) -> None:
+        """
+        Initializes the bucket.
+        Parameters:
+            files (Dict[str, bytes]): The initial files of the bucket, keyed by path.
+            latency (float): The simulated network latency of each operation, in seconds.
+        """
+        self.files = files
+        self.latency = latency
+        self.lock = threading.Lock()
+
+    def list(self) -> List[Dict[str, str]]:
+        time.sleep(self.latency)
+        with self.lock:
+            return [{'name': path} for path in self.files]
+
+    def download(self, path: str) -> bytes:
+        time.sleep(self.latency)
+        with self.lock:
+            if path not in self.files:
+                raise FileNotFoundError('Object not found: {}'.format(path))
+            return self.files[path]
+
+    def upload(self, file: bytes, path: str, file_options: Dict[str, str] | None = None) -> None:
+        time.sleep(self.latency)
+        with self.lock:
+            self.files[path] = file
+
+
+class FakeStorage:
+    """
+    In-process stand-in for the Supabase storage client.
+    """
+    def __init__(self, buckets: Dict[str, FakeBucket]) -> None:
+        self.buckets = buckets
+
+    def from_(self, bucket_name: str) -> FakeBucket:
+        return self.buckets[bucket_name]
+
+
+class FakeSupabaseClient:
+    """
+    In-process stand-in for the Supabase client, with a 'results' table and an 'interviews' storage bucket.
+    Attributes:
+        tables (Dict[str, FakeTable]): The tables of the database, keyed by name.
+        storage (FakeStorage): The storage client.
+    """
+    def __init__(self, results: List[Dict[str, Any]], files: Dict[str, bytes], bucket_name: str,
+                 latency: float = 0) -> None:
+        """
+        Initializes the client.
+        Parameters:
+            results (List[Dict[str, Any]]): The initial rows of the 'results' table.
+            files (Dict[str, bytes]): The initial files of the storage bucket, keyed by path.
+            bucket_name (str): The name of the storage bucket.
+            latency (float): The simulated network latency of each operation, in seconds.
+        """
+        self.tables = {'results': FakeTable(results, latency)}
+        self.storage = FakeStorage({bucket_name: FakeBucket(files, latency)})
+
+    def table(self, name: str) -> FakeQuery:
+        return FakeQuery(self.tables[name])
@@ -0,0 +1,327 @@
+"""
+Load test for the /analyse_audio service.
+
+Starts app.py on a local port against an in-process fake of the Supabase 'results' table and 'interviews' storage
+bucket, with a tiny random-weight audio classifier in place of the real model, then drives concurrent requests
+over short, long or mixed interviews and writes latency percentiles, throughput and peak memory to a JSON file.
+
+Usage (from the repository root):
+    python -m test.load.run --mix mixed --concurrency 4 --requests 40 --output load_test.json
+"""
+import io
+import sys
+import json
+import time
+import random
+import shutil
+import socket
+import argparse
+import resource
+import platform
+import threading
+import tempfile
+import subprocess
+import numpy as np
+import urllib.error
+import urllib.request
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Tuple
+from concurrent.futures import ThreadPoolExecutor
+
+import torch
+import uvicorn
+from pydub import AudioSegment
+from pydub.generators import Sine, WhiteNoise
+from transformers import Wav2Vec2Config, Wav2Vec2FeatureExtractor, Wav2Vec2ForSequenceClassification
+
+from test.load.fakes import FakeSupabaseClient
+
+LABELS = ['anger', 'disgust', 'fear', 'joy', 'neutral', 'sadness', 'surprise']
+SESSION_ID = 1
+
+# Number of segments and segment duration (ms) of each kind of interview
+INTERVIEWS = {'short': (5, 3000),
+              'long': (60, 5000)}
+
+
+class TinyModelLoader:
+    """
+    Replaces the from_pretrained loaders used by Models, returning a tiny random-weight wav2vec2 classifier and
+    its feature extractor whatever the requested model id.
+    """
+    def __init__(self, seed: int) -> None:
+        torch.manual_seed(seed)
+        config = Wav2Vec2Config(hidden_size=32,
+                                num_hidden_layers=2,
+                                num_attention_heads=2,
+                                intermediate_size=64,
+                                conv_dim=(32, 32, 32),
+                                conv_stride=(5, 4, 4),
+                                conv_kernel=(10, 8, 8),
+                                num_conv_pos_embeddings=16,
+                                num_conv_pos_embedding_groups=4,
+                                classifier_proj_size=16,
+                                num_labels=len(LABELS),
+                                id2label=dict(enumerate(LABELS)),
+                                label2id={label: i for i, label in enumerate(LABELS)})
+        self.model = Wav2Vec2ForSequenceClassification(config).eval()
+        self.feature_extractor = Wav2Vec2FeatureExtractor(sampling_rate=16000,
+                                                          do_normalize=True,
+                                                          return_attention_mask=True)
+
+    def model_from_pretrained(self, model_id: str) -> Wav2Vec2ForSequenceClassification:
+        return self.model
+
+    def feature_extractor_from_pretrained(self, model_id: str) -> Wav2Vec2FeatureExtractor:
+        return self.feature_extractor
+
+
+def build_audio(segments: int, segment_ms: int, rng: random.Random) -> bytes:
+    """
+    Builds an mp3 interview made of tones of random pitch over a noise floor.
+    Parameters:
+        segments (int): The number of segments of the interview.
+        segment_ms (int): The duration of each segment, in milliseconds.
+        rng (random.Random): The random generator used for the pitches.
+    Returns:
+        bytes: The mp3 encoded audio.
+    """
+    audio = AudioSegment.empty()
+    for _ in range(segments):
+        tone = Sine(rng.uniform(100, 800)).to_audio_segment(duration=segment_ms, volume=-12)
+        audio += tone.overlay(WhiteNoise().to_audio_segment(duration=segment_ms, volume=-30))
+    output = io.BytesIO()
+    audio.export(output, format='mp3')
+    return output.getvalue()
+
+
+def build_dataset(kinds: List[str], per_kind: int, audio_name: str,
+                  seed: int) -> Tuple[List[Dict[str, Any]], Dict[str, bytes], Dict[int, str]]:
+    """
+    Builds the rows of the 'results' table and the files of the storage bucket for the interviews of the test.
+    Parameters:
+        kinds (List[str]): The kinds of interviews to build.
+        per_kind (int): The number of interviews of each kind.
+        audio_name (str): The name of the raw audio file of an interview.
+        seed (int): The seed of the random generator.
+    Returns:
+        Tuple[List[Dict[str, Any]], Dict[str, bytes], Dict[int, str]]: The rows of the 'results' table,
+            the files of the storage bucket keyed by path, and the kind of each interview keyed by interview id.
+    """
+    rng = random.Random(seed)
+    results = list()
+    files = dict()
+    interviews = dict()
+    results_id = 1
+    interview_id = 1
+    for kind in kinds:
+        segments, segment_ms = INTERVIEWS[kind]
+        audio = build_audio(segments, segment_ms, rng)
+        for _ in range(per_kind):
+            files['{}/{}/raw/{}'.format(SESSION_ID, interview_id, audio_name)] = audio
+            for i in range(segments):
+                results.append({'id': results_id,
+                                'interview_id': interview_id,
+                                'speaker': 0,
+                                'start': i * segment_ms,
+                                'end': (i + 1) * segment_ms,
+                                'audio_emotions': None})
+                results_id += 1
+            interviews[interview_id] = kind
+            interview_id += 1
+    return results, files, interviews
+
+
+def start_server(app: Any) -> Tuple[uvicorn.Server, threading.Thread, int]:
+    """
+    Starts the FastAPI application on a free local port in a background thread.
+    Parameters:
+        app (Any): The FastAPI application.
+    Returns:
+        Tuple[uvicorn.Server, threading.Thread, int]: The server, its thread and its port.
+    """
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        port = s.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(app, host='127.0.0.1', port=port, log_level='warning'))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        if not thread.is_alive():
+            raise RuntimeError('The server failed to start')
+        time.sleep(0.05)
+    return server, thread, port
+
+
+def send_request(port: int, interview_id: int, embeddings: bool) -> Tuple[float, int, str]:
+    """
+    Sends an /analyse_audio request for an interview.
+    Parameters:
+        port (int): The port of the server.
+        interview_id (int): The interview ID to analyse.
+        embeddings (bool): Whether to request the segment embeddings.
+    Returns:
+        Tuple[float, int, str]: The latency of the request in seconds, its HTTP status code and its response body,
+                                or a status code of 0 and the error message if no response was received.
+    """
+    url = 'http://127.0.0.1:{}/analyse_audio?session_id={}&interview_id={}'.format(port, SESSION_ID, interview_id)
+    if embeddings:
+        url += '&embeddings=true'
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(urllib.request.Request(url, method='POST'), timeout=600) as response:
+            body = response.read().decode()
+            status = response.status
+    except urllib.error.HTTPError as e:
+        body = e.read().decode()
+        status = e.code
+    except (urllib.error.URLError, OSError) as e:
+        # Connection failures and timeouts are reported as errors of the run rather than aborting it
+        body = str(e)
+        status = 0
+    return time.perf_counter() - start, status, body
+
+
+def summarize(latencies: List[float]) -> Dict[str, float | int | None]:
+    """
+    Computes the latency percentiles of a list of requests.
+    Parameters:
+        latencies (List[float]): The latencies of the requests, in seconds.
+    Returns:
+        Dict[str, float | int | None]: The number of requests and their p50, p95, p99 and max latencies in ms.
+    """
+    if len(latencies) == 0:
+        return {'requests': 0, 'p50_ms': None, 'p95_ms': None, 'p99_ms': None, 'max_ms': None}
+    p50, p95, p99 = np.percentile(np.array(latencies) * 1000, [50, 95, 99])
+    return {'requests': len(latencies),
+            'p50_ms': round(float(p50), 3),
+            'p95_ms': round(float(p95), 3),
+            'p99_ms': round(float(p99), 3),
+            'max_ms': round(max(latencies) * 1000, 3)}
+
+
+def peak_rss_mb() -> float:
+    """
+    Returns the peak resident set size of the process, in megabytes.
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes on Linux
+    return round(peak / (1024 * 1024) if platform.system() == 'Darwin' else peak / 1024, 3)
+
+
+def git_commit() -> str | None:
+    """
+    Returns the commit of the working tree, so that results can be compared across commits.
+    """
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def bounded_int(minimum: int) -> Callable[[str], int]:
+    """
+    Builds an argparse type accepting integers greater than or equal to a minimum.
+    Parameters:
+        minimum (int): The smallest accepted value.
+    Returns:
+        Callable[[str], int]: The argparse type.
+    """
+    def parse(value: str) -> int:
+        number = int(value)
+        if number < minimum:
+            raise argparse.ArgumentTypeError('must be >= {}, got {}'.format(minimum, number))
+        return number
+    return parse
+
+
+def parse_args(argv: List[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Load test for the /analyse_audio service.')
+    parser.add_argument('--mix', choices=['short', 'long', 'mixed'], default='mixed',
+                        help='Kind of interviews to request, mixed alternates short and long ones at random.')
+    parser.add_argument('--concurrency', type=bounded_int(1), default=4, help='Number of concurrent clients.')
+    parser.add_argument('--requests', type=bounded_int(1), default=40, help='Number of measured requests.')
+    parser.add_argument('--warmup', type=bounded_int(0), default=2, help='Number of unmeasured requests sent first.')
+    parser.add_argument('--interviews', type=bounded_int(1), default=4,
+                        help='Number of distinct interviews of each kind.')
+    parser.add_argument('--latency-ms', type=float, default=0,
+                        help='Simulated Supabase latency of each database or storage operation.')
+    parser.add_argument('--embeddings', action='store_true', help='Request the segment embeddings as well.')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the model weights, audio and request mix.')
+    parser.add_argument('--output', default='load_test.json', help='Path of the JSON report.')
+    return parser.parse_args(argv)
+
+
+def main(argv: List[str]) -> Dict[str, Any]:
+    args = parse_args(argv)
+    kinds = ['short', 'long'] if args.mix == 'mixed' else [args.mix]
+
+    # The model loaders and the Supabase client are replaced before app.py instantiates them at import time
+    import utils.models
+    import utils.utils
+    loader = TinyModelLoader(args.seed)
+    utils.models.AutoModelForAudioClassification.from_pretrained = loader.model_from_pretrained
+    utils.models.Wav2Vec2FeatureExtractor.from_pretrained = loader.feature_extractor_from_pretrained
+
+    config = utils.models.Models().config
+    results, files, interviews = build_dataset(kinds, args.interviews, config['GENERAL']['Audioname'], args.seed)
+    client = FakeSupabaseClient(results, files, config['SUPABASE']['InputBucket'], args.latency_ms / 1000)
+    utils.utils.create_client = lambda url, key: client
+
+    import app
+    from utils.logs import log_uploader
+
+    rng = random.Random(args.seed)
+    interview_ids = list(interviews)
+    plan = [rng.choice(interview_ids) for _ in range(args.warmup + args.requests)]
+
+    # Feature cache and embedding stores are written to a temporary folder rather than the real ones, so that the
+    # random-weight outputs can never be served to real runs
+    data_folder = tempfile.mkdtemp(prefix='load_test_')
+    config['FOLDERS']['Main'] = data_folder
+
+    server, thread, port = start_server(app.app)
+    try:
+        for interview_id in plan[:args.warmup]:
+            send_request(port, interview_id, args.embeddings)
+        rss_before = peak_rss_mb()
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+            responses = list(executor.map(lambda i: send_request(port, i, args.embeddings), plan[args.warmup:]))
+        duration = time.perf_counter() - start
+    finally:
+        server.should_exit = True
+        thread.join()
+        log_uploader.close()
+        shutil.rmtree(data_folder, ignore_errors=True)
+
+    succeeded = [(latency, interviews[i]) for (latency, status, _), i in zip(responses, plan[args.warmup:])
+                 if status == 200]
+    failed = [body for _, status, body in responses if status != 200]
+    requested = set(plan)
+    report = {'commit': git_commit(),
+              'timestamp': datetime.now().isoformat(timespec='seconds'),
+              'config': vars(args),
+              'device': utils.models.Models().device,
+              'duration_s': round(duration, 3),
+              'throughput_rps': round(len(succeeded) / duration, 3),
+              'errors': len(failed),
+              'first_error': failed[0] if failed else None,
+              'latency': summarize([latency for latency, _ in succeeded]),
+              'latency_by_kind': {kind: summarize([latency for latency, k in succeeded if k == kind])
+                                  for kind in kinds},
+              'unprocessed_segments': sum(1 for row in results
+                                          if row['interview_id'] in requested and row['audio_emotions'] is None),
+              'memory': {'peak_rss_before_mb': rss_before,
+                         'peak_rss_mb': peak_rss_mb()}}
+    if torch.cuda.is_available():
+        report['memory']['peak_cuda_mb'] = round(torch.cuda.max_memory_allocated() / (1024 * 1024), 3)
+
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    return report
+
+
+if __name__ == '__main__':
+    print(json.dumps(main(sys.argv[1:]), indent=2))
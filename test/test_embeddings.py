@@ -0,0 +1,53 @@
+import os
+
+import numpy as np
+import pytest
+
+from utils.embeddings import EmbeddingStore
+
+
+@pytest.fixture
+def store(tmp_path) -> EmbeddingStore:
+    store = EmbeddingStore(str(tmp_path), 'org/model', 1, 2)
+    store.save([1, 2, 3, 4], np.array([[1, 0], [0.9, 0.1], [0, 1], [-1, 0]], dtype=np.float16))
+    return store
+
+
+def test_top_k_is_ordered_and_excludes_query(store: EmbeddingStore) -> None:
+    similar = store.top_k(1, 3)
+    assert [segment['id'] for segment in similar] == [2, 3, 4]
+    assert similar[0]['score'] > similar[1]['score'] > similar[2]['score']
+    assert similar[2]['score'] == pytest.approx(-1, abs=1e-3)
+
+
+def test_top_k_limits_results(store: EmbeddingStore) -> None:
+    assert [segment['id'] for segment in store.top_k(1, 1)] == [2]
+    assert len(store.top_k(1, 10)) == 3
+
+
+def test_top_k_with_non_positive_k(store: EmbeddingStore) -> None:
+    assert store.top_k(1, 0) == []
+    assert store.top_k(1, -1) == []
+
+
+def test_top_k_unknown_segment(store: EmbeddingStore) -> None:
+    with pytest.raises(KeyError):
+        store.top_k(9, 1)
+
+
+def test_save_replaces_existing_ids(store: EmbeddingStore) -> None:
+    store.save([4], np.array([[1, 0]]))
+    stored = store.load()
+    assert sorted(stored) == [1, 2, 3, 4]
+    assert stored[4].dtype == np.float16
+    np.testing.assert_array_equal(stored[4], [1, 0])
+
+
+def test_unreadable_store_is_replaced(store: EmbeddingStore) -> None:
+    with open(os.path.join(store.folder, EmbeddingStore.EMBEDDINGS_FILE), 'wb') as f:
+        f.write(b'not a zip file')
+    assert store.load() == {}
+
+    store.save([5, 6], np.array([[1, 0], [0, 1]], dtype=np.float16))
+    assert sorted(store.load()) == [5, 6]
+    assert os.listdir(store.folder) == [EmbeddingStore.EMBEDDINGS_FILE]
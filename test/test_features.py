@@ -0,0 +1,119 @@
+import os
+
+import numpy as np
+import pytest
+
+from utils.features import FeatureCache
+
+
+class FakeFeatureExtractor:
+    def __init__(self, sampling_rate: int = 16000) -> None:
+        self.sampling_rate = sampling_rate
+
+    def to_dict(self) -> dict:
+        return {'sampling_rate': self.sampling_rate}
+
+
+@pytest.fixture
+def folder(tmp_path) -> str:
+    return str(tmp_path)
+
+
+def test_round_trip(folder: str) -> None:
+    cache = FeatureCache(folder, FakeFeatureExtractor(), 1, 2)
+    assert cache.get(10, 0, 1000) is None
+
+    cache.put(10, 0, 1000, np.arange(4, dtype=np.float32))
+    cache.put(11, 1000, 2000, np.ones(3, dtype=np.float32))
+    cache.save()
+
+    cache = FeatureCache(folder, FakeFeatureExtractor(), 1, 2)
+    np.testing.assert_array_equal(cache.get(10, 0, 1000), np.arange(4, dtype=np.float32))
+    np.testing.assert_array_equal(cache.get(11, 1000, 2000), np.ones(3, dtype=np.float32))
+    assert cache.get(10, 0, 1000).dtype == np.float32
+
+
+def test_changed_boundaries_miss(folder: str) -> None:
+    cache = FeatureCache(folder, FakeFeatureExtractor(), 1, 2)
+    cache.put(10, 0, 1000, np.arange(4))
+    cache.save()
+
+    cache = FeatureCache(folder, FakeFeatureExtractor(), 1, 2)
+    assert cache.get(10, 0, 1500) is None
+    assert cache.get(10, 500, 1000) is None
+
+
+def test_save_keeps_and_replaces_entries(folder: str) -> None:
+    cache = FeatureCache(folder, FakeFeatureExtractor(), 1, 2)
+    cache.put(10, 0, 1000, np.arange(4))
+    cache.put(11, 1000, 2000, np.ones(3))
+    cache.save()
+
+    cache = FeatureCache(folder, FakeFeatureExtractor(), 1, 2)
+    cache.put(10, 0, 500, np.zeros(2))
+    cache.save()
+
+    cache = FeatureCache(folder, FakeFeatureExtractor(), 1, 2)
+    assert cache.get(10, 0, 1000) is None
+    np.testing.assert_array_equal(cache.get(10, 0, 500), np.zeros(2))
+    np.testing.assert_array_equal(cache.get(11, 1000, 2000), np.ones(3))
+
+
+def test_different_extractor_config_is_isolated(folder: str) -> None:
+    cache = FeatureCache(folder, FakeFeatureExtractor(16000), 1, 2)
+    cache.put(10, 0, 1000, np.arange(4))
+    cache.save()
+
+    assert FeatureCache(folder, FakeFeatureExtractor(8000), 1, 2).get(10, 0, 1000) is None
+
+
+def test_missing_features_file_resets_index(folder: str) -> None:
+    cache = FeatureCache(folder, FakeFeatureExtractor(), 1, 2)
+    cache.put(10, 0, 1000, np.arange(4))
+    cache.save()
+    os.remove(os.path.join(cache.folder, cache.features_file))
+
+    cache = FeatureCache(folder, FakeFeatureExtractor(), 1, 2)
+    assert cache.index == {}
+    assert cache.get(10, 0, 1000) is None
+
+    cache.put(11, 1000, 2000, np.ones(3))
+    cache.save()
+    np.testing.assert_array_equal(FeatureCache(folder, FakeFeatureExtractor(), 1, 2).get(11, 1000, 2000),
+                                  np.ones(3))
+
+
+def test_unreadable_index_is_empty(folder: str) -> None:
+    cache = FeatureCache(folder, FakeFeatureExtractor(), 1, 2)
+    cache.put(10, 0, 1000, np.arange(4))
+    cache.save()
+    with open(os.path.join(cache.folder, FeatureCache.INDEX_FILE), 'w') as f:
+        f.write('{"features_file": ')
+
+    cache = FeatureCache(folder, FakeFeatureExtractor(), 1, 2)
+    assert cache.index == {}
+    assert cache.get(10, 0, 1000) is None
+
+
+def test_features_file_not_matching_index_resets_index(folder: str) -> None:
+    cache = FeatureCache(folder, FakeFeatureExtractor(), 1, 2)
+    cache.put(10, 0, 1000, np.arange(4))
+    cache.save()
+    with open(os.path.join(cache.folder, cache.features_file), 'ab') as f:
+        f.write(np.zeros(2, dtype=np.float16).tobytes())
+
+    assert FeatureCache(folder, FakeFeatureExtractor(), 1, 2).get(10, 0, 1000) is None
+
+
+def test_save_replaces_previous_features_file(folder: str) -> None:
+    cache = FeatureCache(folder, FakeFeatureExtractor(), 1, 2)
+    cache.put(10, 0, 1000, np.arange(4))
+    cache.save()
+    previous = cache.features_file
+
+    cache = FeatureCache(folder, FakeFeatureExtractor(), 1, 2)
+    cache.put(11, 1000, 2000, np.ones(3))
+    cache.save()
+
+    assert cache.features_file != previous
+    assert sorted(os.listdir(cache.folder)) == sorted([cache.features_file, FeatureCache.INDEX_FILE])
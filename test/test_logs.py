@@ -0,0 +1,94 @@
+import gzip
+import json
+import logging
+from typing import Any, Dict, List
+
+import pytest
+
+from utils.logs import LogUploader, RequestLogger, RequestLogHandler
+
+
+class FakeConnection:
+    def __init__(self) -> None:
+        self.uploads = list()
+
+    def upload(self, file: bytes, path: str, file_options: Dict[str, str]) -> None:
+        self.uploads.append((path, file, file_options))
+
+
+def read_log(payload: bytes) -> List[Dict[str, Any]]:
+    return [json.loads(line) for line in gzip.decompress(payload).decode('utf-8').splitlines()]
+
+
+@pytest.fixture
+def logger() -> logging.Logger:
+    logger = logging.getLogger('audioLog.test')
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    yield logger
+    for handler in logger.handlers[:]:
+        logger.removeHandler(handler)
+
+
+def test_ring_buffer_evicts_oldest_records(logger: logging.Logger) -> None:
+    handler = RequestLogHandler('log.jsonl.gz', 'r1', capacity=3)
+    logger.addHandler(handler)
+    log = RequestLogger(logger, {'request_id': 'r1'})
+
+    for i in range(5):
+        log.info('record %s', i)
+
+    entries = read_log(handler.dump())
+    assert entries[0]['level'] == 'WARNING'
+    assert entries[0]['dropped'] == 2
+    assert [entry['message'] for entry in entries[1:]] == ['record 2', 'record 3', 'record 4']
+    assert all(entry['request_id'] == 'r1' for entry in entries[1:])
+
+
+def test_records_of_other_requests_are_ignored(logger: logging.Logger) -> None:
+    first = RequestLogHandler('first.jsonl.gz', 'r1', capacity=10)
+    second = RequestLogHandler('second.jsonl.gz', 'r2', capacity=10)
+    logger.addHandler(first)
+    logger.addHandler(second)
+
+    RequestLogger(logger, {'request_id': 'r1'}).info('from first')
+    RequestLogger(logger, {'request_id': 'r2'}).error(('from', 'second'))
+    logger.info('untagged')
+
+    assert [entry['message'] for entry in read_log(first.dump())] == ['from first']
+    assert [entry['message'] for entry in read_log(second.dump())] == ["('from', 'second')"]
+
+
+def test_structured_fields_are_merged(logger: logging.Logger) -> None:
+    handler = RequestLogHandler('log.jsonl.gz', 'r1', capacity=10)
+    logger.addHandler(handler)
+
+    RequestLogger(logger, {'request_id': 'r1'}).info('stage', extra={'fields': {'stage': 'load', 'duration_ms': 1.5}})
+
+    entry = read_log(handler.dump())[0]
+    assert entry['stage'] == 'load'
+    assert entry['duration_ms'] == 1.5
+    assert entry['request_id'] == 'r1'
+
+
+def test_empty_buffer_dumps_nothing() -> None:
+    assert RequestLogHandler('log.jsonl.gz', 'r1', capacity=10).dump() == b''
+
+
+def test_uploader_compresses_and_uploads_in_background(logger: logging.Logger) -> None:
+    handler = RequestLogHandler('log.jsonl.gz', 'r1', capacity=10)
+    logger.addHandler(handler)
+    RequestLogger(logger, {'request_id': 'r1'}).info('hello')
+    logger.removeHandler(handler)
+
+    connection = FakeConnection()
+    uploader = LogUploader()
+    uploader.submit(connection, '1/2/logs/log.jsonl.gz', handler)
+    uploader.submit(connection, '1/2/logs/empty.jsonl.gz', RequestLogHandler('empty.jsonl.gz', 'r2', capacity=10))
+    uploader.close()
+
+    assert len(connection.uploads) == 1
+    path, payload, file_options = connection.uploads[0]
+    assert path == '1/2/logs/log.jsonl.gz'
+    assert file_options == {'content-type': 'application/gzip'}
+    assert read_log(payload)[0]['message'] == 'hello'
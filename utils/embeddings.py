@@ -0,0 +1,108 @@
+import os
+import zipfile
+import tempfile
+import numpy as np
+from typing import Dict, Iterable, List
+
+
+class EmbeddingStore:
+    """
+    On-disk store of the pooled hidden-state embeddings of the segments of one interview, as a float16 matrix
+    indexed by results id, both kept in a single file so that they are always replaced together. It lets downstream
+    consumers reuse the embeddings computed during the emotions forward pass and search for the segments most
+    similar to a given one.
+    Attributes:
+        folder (str): The folder holding the embeddings file of the interview.
+    """
+    EMBEDDINGS_FILE = 'embeddings.npz'
+
+    def __init__(self, folder: str, model_id: str, session_id: int, interview_id: int) -> None:
+        """
+        Initializes the EmbeddingStore for an interview.
+        Parameters:
+            folder (str): The root folder of the embedding store.
+            model_id (str): The identifier of the model producing the embeddings.
+            session_id (int): The session ID of the interview.
+            interview_id (int): The interview ID of the interview.
+        """
+        self.folder = os.path.join(folder,
+                                   model_id.replace('/', '__'),
+                                   '{}_{}'.format(session_id, interview_id))
+
+    def load(self) -> Dict[int, np.ndarray]:
+        """
+        Loads the stored embeddings of the interview.
+        Returns:
+            Dict[int, np.ndarray]: The float16 embeddings keyed by results id, empty if none are stored or the
+                                   embeddings file can not be read.
+        """
+        path = os.path.join(self.folder, self.EMBEDDINGS_FILE)
+        if not os.path.exists(path):
+            return dict()
+        try:
+            with np.load(path) as store:
+                ids = store['ids']
+                embeddings = store['embeddings']
+            return {int(results_id): embeddings[i] for i, results_id in enumerate(ids)}
+        except (OSError, ValueError, KeyError, IndexError, EOFError, zipfile.BadZipFile):
+            # An unreadable store is rebuilt from the embeddings of the next save
+            return dict()
+
+    def save(self, ids: Iterable[int], embeddings: np.ndarray) -> None:
+        """
+        Stores the embeddings of segments of the interview, replacing the ones already stored for the same ids.
+        The file is written to a uniquely named temporary file and then moved into place, so that a concurrent
+        reader sees either the previous or the new ids and embeddings, never a mix of both. An unreadable store is
+        replaced by the new embeddings.
+        Parameters:
+            ids (Iterable[int]): The results ids of the segments.
+            embeddings (np.ndarray): The embeddings of the segments, one row per id.
+        """
+        stored = self.load()
+        stored.update({int(results_id): embedding for results_id, embedding in zip(ids, embeddings)})
+        if len(stored) == 0:
+            return
+
+        os.makedirs(self.folder, exist_ok=True)
+        path = os.path.join(self.folder, self.EMBEDDINGS_FILE)
+
+        fd, tmp_path = tempfile.mkstemp(prefix='embeddings_', suffix='.tmp', dir=self.folder)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.savez(f,
+                         ids=np.fromiter(stored.keys(), dtype=np.int64),
+                         embeddings=np.stack([np.asarray(embedding, dtype=np.float16)
+                                              for embedding in stored.values()]))
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def top_k(self, results_id: int, k: int) -> List[Dict[str, float]]:
+        """
+        Searches the segments of the interview most similar to a given segment, by cosine similarity.
+        Parameters:
+            results_id (int): The results id of the segment to compare with.
+            k (int): The maximum number of segments to return.
+        Returns:
+            List[Dict[str, float]]: The ids and similarity scores of the most similar segments, in descending order.
+        Raises:
+            KeyError: If no embedding is stored for the given results id.
+        """
+        stored = self.load()
+        if results_id not in stored:
+            raise KeyError('No embedding stored for the segment {}'.format(results_id))
+
+        ids = np.fromiter((i for i in stored.keys() if i != results_id), dtype=np.int64)
+        if len(ids) == 0 or k <= 0:
+            return list()
+
+        candidates = np.stack([stored[i] for i in ids]).astype(np.float32)
+        query = stored[results_id].astype(np.float32)
+
+        norms = np.linalg.norm(candidates, axis=1) * np.linalg.norm(query)
+        scores = candidates @ query / np.where(norms == 0, 1, norms)
+
+        best = np.argsort(-scores)[:k]
+        return [{'id': int(ids[i]), 'score': round(float(scores[i]), 5)} for i in best]
@@ -0,0 +1,185 @@
+import os
+import json
+import hashlib
+import tempfile
+import numpy as np
+from typing import Any, Dict, Tuple
+
+
+class FeatureCache:
+    """
+    On-disk store of the normalized input features produced by the feature extractor for the segments of one
+    interview. Features are kept in a single memory-mapped float16 array, with an offset index keyed by results id,
+    so that later runs against models sharing the same feature extractor configuration can skip the decode,
+    resample and normalize steps and go straight to the forward pass.
+    Attributes:
+        folder (str): The folder holding the features and index files of the interview.
+        features_file (str | None): The name of the features file the index refers to, None if nothing is stored.
+        index (Dict[int, Dict[str, int]]): The offset index of the stored features, keyed by results id.
+        pending (Dict[int, Dict[str, Any]]): Features added during this run and not yet written to disk.
+    """
+    FEATURES_PREFIX = 'features_'
+    FEATURES_SUFFIX = '.f16'
+    INDEX_FILE = 'index.json'
+
+    def __init__(self, folder: str, feature_extractor: Any, session_id: int, interview_id: int) -> None:
+        """
+        Initializes the FeatureCache for an interview and loads its index if it already exists on disk.
+        Parameters:
+            folder (str): The root folder of the feature cache.
+            feature_extractor (Any): The feature extractor whose configuration identifies the stored features.
+            session_id (int): The session ID of the interview.
+            interview_id (int): The interview ID of the interview.
+        """
+        self.folder = os.path.join(folder,
+                                   self.__get_config_hash(feature_extractor),
+                                   '{}_{}'.format(session_id, interview_id))
+        self.features_file, total, self.index = self.__load_index()
+        self.features = self.__load_features(total)
+        if self.features is None:
+            # An index without usable features can not be served, the store is rebuilt on the next save
+            self.features_file = None
+            self.index = dict()
+        self.pending = dict()
+
+    @staticmethod
+    def __get_config_hash(feature_extractor: Any) -> str:
+        """
+        Computes a short hash of the feature extractor configuration, so that models sharing the same configuration
+        share the same stored features.
+        Parameters:
+            feature_extractor (Any): The feature extractor to identify.
+        Returns:
+            str: The hexadecimal hash of the feature extractor configuration.
+        """
+        config = json.dumps(feature_extractor.to_dict(), sort_keys=True, default=str)
+        return hashlib.sha1(config.encode()).hexdigest()[:16]
+
+    def __load_index(self) -> Tuple[str | None, int, Dict[int, Dict[str, int]]]:
+        """
+        Loads the index of the interview from disk. An unreadable index is treated as empty.
+        Returns:
+            Tuple[str | None, int, Dict[int, Dict[str, int]]]: The name and expected length of the features file,
+                                                              and the offset index keyed by results id, or
+                                                              (None, 0, {}) if no features are stored yet.
+        """
+        path = os.path.join(self.folder, self.INDEX_FILE)
+        try:
+            with open(path) as f:
+                index = json.load(f)
+            return (os.path.basename(index['features_file']),
+                    int(index['total']),
+                    {int(key): value for key, value in index['segments'].items()})
+        except (OSError, ValueError, KeyError, TypeError, AttributeError):
+            return None, 0, dict()
+
+    def __load_features(self, total: int) -> np.memmap | None:
+        """
+        Memory-maps the features file named by the index in read-only mode.
+        Parameters:
+            total (int): The length of the features file recorded in the index.
+        Returns:
+            np.memmap | None: The stored features, or None if no features are stored yet or the features file is
+                              missing or does not match the index.
+        """
+        if len(self.index) == 0 or self.features_file is None:
+            return None
+        path = os.path.join(self.folder, self.features_file)
+        try:
+            if os.path.getsize(path) != total * np.dtype(np.float16).itemsize:
+                return None
+            features = np.memmap(path, dtype=np.float16, mode='r')
+        except (OSError, ValueError):
+            return None
+        if any(entry['offset'] < 0 or entry['offset'] + entry['length'] > total for entry in self.index.values()):
+            return None
+        return features
+
+    def get(self, results_id: int, start: int, end: int) -> np.ndarray | None:
+        """
+        Retrieves the stored features of a segment.
+        Parameters:
+            results_id (int): The results id of the segment.
+            start (int): The start time of the segment, in milliseconds.
+            end (int): The end time of the segment, in milliseconds.
+        Returns:
+            np.ndarray | None: The features of the segment as float32, or None if they are not stored or were
+                               computed for different segment boundaries.
+        """
+        entry = self.index.get(results_id)
+        if entry is None or self.features is None or entry['start'] != start or entry['end'] != end:
+            return None
+        offset = entry['offset']
+        return np.array(self.features[offset:offset + entry['length']], dtype=np.float32)
+
+    def put(self, results_id: int, start: int, end: int, features: np.ndarray) -> None:
+        """
+        Adds the features of a segment to the cache. They are written to disk by save().
+        Parameters:
+            results_id (int): The results id of the segment.
+            start (int): The start time of the segment, in milliseconds.
+            end (int): The end time of the segment, in milliseconds.
+            features (np.ndarray): The one-dimensional normalized input features of the segment.
+        """
+        self.pending[int(results_id)] = {'start': int(start),
+                                         'end': int(end),
+                                         'features': np.asarray(features, dtype=np.float16).ravel()}
+
+    def save(self) -> None:
+        """
+        Writes the stored and pending features of the interview to disk. The features are written to a new, uniquely
+        named file, and the index naming it is then moved into place: replacing the index is the only step a reader
+        can observe, so it always sees a consistent pair. The previous features file is removed afterwards.
+        """
+        if len(self.pending) == 0:
+            return
+
+        segments = {results_id: {'start': entry['start'],
+                                 'end': entry['end'],
+                                 'features': self.features[entry['offset']:entry['offset'] + entry['length']]}
+                    for results_id, entry in self.index.items()
+                    if results_id not in self.pending}
+        segments.update(self.pending)
+
+        os.makedirs(self.folder, exist_ok=True)
+
+        index = dict()
+        offset = 0
+        total = sum(len(segment['features']) for segment in segments.values())
+        fd, features_path = tempfile.mkstemp(prefix=self.FEATURES_PREFIX, suffix=self.FEATURES_SUFFIX,
+                                             dir=self.folder)
+        index_path = None
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for results_id, segment in segments.items():
+                    length = len(segment['features'])
+                    f.write(np.asarray(segment['features'], dtype=np.float16).tobytes())
+                    index[results_id] = {'start': segment['start'],
+                                         'end': segment['end'],
+                                         'offset': offset,
+                                         'length': length}
+                    offset += length
+
+            fd, index_path = tempfile.mkstemp(prefix='index_', suffix='.tmp', dir=self.folder)
+            with os.fdopen(fd, 'w') as f:
+                json.dump({'features_file': os.path.basename(features_path),
+                           'total': total,
+                           'segments': {str(key): value for key, value in index.items()}}, f)
+            os.replace(index_path, os.path.join(self.folder, self.INDEX_FILE))
+        except BaseException:
+            for path in (features_path, index_path):
+                if path is not None and os.path.exists(path):
+                    os.remove(path)
+            raise
+
+        previous = self.features_file
+        self.features_file = os.path.basename(features_path)
+        self.index = index
+        self.features = self.__load_features(total)
+        self.pending = dict()
+
+        if previous is not None and previous != self.features_file:
+            try:
+                os.remove(os.path.join(self.folder, previous))
+            except OSError:
+                pass
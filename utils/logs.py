@@ -0,0 +1,179 @@
+import gzip
+import json
+import queue
+import logging
+import threading
+from collections import deque
+from typing import Any, MutableMapping, Tuple
+
+
+class RequestLogHandler(logging.Handler):
+    """
+    Logging handler that keeps the records of a single request in a bounded ring buffer. Records are stored as
+    structured fields and only serialized when the log is dumped, so that logging stays cheap in the request path.
+    Records from other requests sharing the same logger are ignored.
+    Attributes:
+        buffer (deque): A ring buffer holding the raw fields of the most recent log records.
+        filename (str): The name of the log file for which this handler is created.
+        request_id (str): The identifier of the request whose records are kept.
+        emitted (int): The number of records received, including the ones evicted from the buffer.
+    """
+    def __init__(self, filename: str, request_id: str, capacity: int) -> None:
+        """
+        Initializes the RequestLogHandler for a request.
+        Parameters:
+            filename (str): The name of the log file associated with this handler.
+            request_id (str): The identifier of the request whose records are kept.
+            capacity (int): The maximum number of records kept, the oldest ones are dropped first.
+        """
+        super().__init__()
+        self.buffer = deque(maxlen=capacity)
+        self.filename = filename
+        self.request_id = request_id
+        self.emitted = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        """
+        Keeps only the records of the request of this handler.
+        Parameters:
+            record (logging.LogRecord): The log record to be checked.
+        Returns:
+            bool: True if the record belongs to the request of this handler.
+        """
+        return getattr(record, 'request_id', None) == self.request_id and super().filter(record)
+
+    def emit(self, record: logging.LogRecord) -> None:
+        """
+        Appends the raw fields of a log record to the ring buffer.
+        Parameters:
+            record (logging.LogRecord): The log record to be processed and added to the buffer.
+        """
+        self.emitted += 1
+        self.buffer.append((record.created, record.levelname, record.name, record.funcName, record.lineno,
+                            record.msg, record.args, getattr(record, 'fields', None)))
+
+    @staticmethod
+    def __format_message(msg: Any, args: Any) -> str:
+        """
+        Merges the arguments of a log record into its message, as logging.LogRecord.getMessage() does.
+        Parameters:
+            msg (Any): The message of the record.
+            args (Any): The arguments of the record.
+        Returns:
+            str: The formatted message, or the message followed by its arguments if they do not match.
+        """
+        if not args:
+            return str(msg)
+        try:
+            return str(msg) % args
+        except (TypeError, ValueError):
+            return '{} {}'.format(msg, args)
+
+    def dump(self) -> bytes:
+        """
+        Serializes the buffered records as gzip-compressed JSON lines.
+        Returns:
+            bytes: The compressed log, or empty bytes if no record was buffered.
+        """
+        if len(self.buffer) == 0:
+            return b''
+
+        lines = list()
+        dropped = self.emitted - len(self.buffer)
+        if dropped > 0:
+            lines.append(json.dumps({'level': 'WARNING',
+                                     'message': '{} older log records were dropped'.format(dropped),
+                                     'dropped': dropped}))
+        for created, level, name, function, line, msg, args, fields in list(self.buffer):
+            entry = {'time': created,
+                     'level': level,
+                     'logger': name,
+                     'function': function,
+                     'line': line,
+                     'request_id': self.request_id,
+                     'message': self.__format_message(msg, args)}
+            if fields:
+                entry.update(fields)
+            lines.append(json.dumps(entry, default=str))
+        return gzip.compress('\n'.join(lines).encode('utf-8'))
+
+
+class RequestLogger(logging.LoggerAdapter):
+    """
+    Logger adapter tagging every record with the identifier of the request, and optionally with structured fields
+    passed as extra={'fields': {...}}.
+    """
+    def process(self, msg: Any, kwargs: MutableMapping[str, Any]) -> Tuple[Any, MutableMapping[str, Any]]:
+        """
+        Merges the request identifier into the extra attributes of the record.
+        Parameters:
+            msg (Any): The message of the record.
+            kwargs (MutableMapping[str, Any]): The keyword arguments of the logging call.
+        Returns:
+            Tuple[Any, MutableMapping[str, Any]]: The message and the updated keyword arguments.
+        """
+        kwargs['extra'] = {**kwargs.get('extra', {}), **self.extra}
+        return msg, kwargs
+
+
+class LogUploader:
+    """
+    Compresses and uploads the logs of finished requests to the S3 bucket on a background thread, so that neither
+    step adds to the latency of the request that produced them.
+    """
+    def __init__(self) -> None:
+        """
+        Initializes the LogUploader. The background thread is started on the first submitted upload.
+        """
+        self.queue = queue.Queue()
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def submit(self, connection: Any, path: str, handler: RequestLogHandler) -> None:
+        """
+        Queues the log of a finished request for upload. The handler must no longer be attached to a logger.
+        Parameters:
+            connection (Any): The connection to the S3 bucket.
+            path (str): The path of the log file within the S3 bucket.
+            handler (RequestLogHandler): The handler holding the records of the request.
+        """
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self.__run, name='LogUploader', daemon=True)
+                self.thread.start()
+        self.queue.put((connection, path, handler))
+
+    def close(self, timeout: float = 30) -> None:
+        """
+        Waits for the queued uploads to finish and stops the background thread.
+        Parameters:
+            timeout (float): The maximum number of seconds to wait for the queued uploads.
+        """
+        with self.lock:
+            if self.thread is None:
+                return
+            self.queue.put(None)
+            self.thread.join(timeout)
+            self.thread = None
+
+    def __run(self) -> None:
+        """
+        Compresses and uploads the queued logs until close() is called.
+        """
+        while True:
+            job = self.queue.get()
+            if job is None:
+                break
+            connection, path, handler = job
+            try:
+                payload = handler.dump()
+                if not payload:
+                    continue
+                connection.upload(file=payload,
+                                  path=path,
+                                  file_options={'content-type': 'application/gzip'})
+            except Exception as e:
+                print('Error uploading the log file {} to the S3 bucket : {}.'.format(path, str(e)))
+
+
+log_uploader = LogUploader()
@@ -52,6 +52,17 @@ class Models:
                 sys.exit()
         return config
 
+    def get_data_folder(self, section: str) -> str:
+        """
+        Returns the local folder configured for a data store, inside the main files folder of the application.
+        Parameters:
+            section (str): The configuration section of the data store, holding its 'Folder' setting.
+        Returns:
+            str: The absolute path of the folder.
+        """
+        base_path = os.path.dirname(os.path.dirname(__file__))
+        return os.path.join(base_path, self.config['FOLDERS']['Main'], self.config[section]['Folder'])
+
     def __init_models(self, ate_model_id) -> Tuple:
         """
         Initializes and returns the audio classification model and feature extractor based on the provided model ID.
@@ -1,56 +1,21 @@
 import os
 import sys
+import time
+import uuid
 import logging
 import configparser
 import pandas as pd
-from typing import Any, Dict
 from datetime import datetime
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Tuple
 from supabase import create_client, Client
+from utils.logs import RequestLogHandler, RequestLogger, log_uploader
 
 
-class BufferingHandler(logging.Handler):
+class Connections:
     """
-    Custom logging handler that buffers log records in memory. This handler is useful for situations where
-    logs need to be accumulated and processed in bulk rather than being written out individually.
-    Attributes:
-        buffer (list): A list to hold formatted log records.
-        filename (str): The name of the log file for which this handler is created.
-    """
-    def __init__(self, filename: str) -> None:
-        """
-        Initializes the BufferingHandler with a specified filename.
-        Parameters:
-            filename (str): The name of the log file associated with this handler.
-        """
-        super().__init__()
-        self.buffer = []
-        self.filename = filename
-
-    def emit(self, record: logging.LogRecord) -> None:
-        """
-        Formats and appends a log record to the buffer.
-        Parameters:
-            record (logging.LogRecord): The log record to be processed and added to the buffer.
-        """
-        # Append the log record to the buffer
-        self.buffer.append(self.format(record))
-
-    def flush(self) -> str:
-        """
-        Flushes the buffer by joining all buffered log records into a single string. Clears the buffer afterward.
-        Returns:
-            str: A single string containing all buffered log records separated by newlines.
-                  Returns an empty string if the buffer is empty.
-        """
-        if len(self.buffer) > 0:
-            return '\n'.join(self.buffer)
-        else:
-            return ''
-
-
-class Utils:
-    """
-    Provides utility functions and classes for logging, configuration management, and interaction with cloud storage.
+    Holds the configuration and the Supabase clients shared by all the requests of the application.
+    It ensures a single instance (singleton) is used throughout the application.
     """
     _instance = None
 
@@ -60,26 +25,14 @@ class Utils:
             cls._instance.__initialized = False
         return cls._instance
 
-    def __init__(self, session_id: int, interview_id: int) -> None:
+    def __init__(self) -> None:
         """
-        Parameters:
-            session_id (int)
-            interview_id (int)
         Functionality:
-            Initializes logging, configuration, and database client (supabase_client).
+            Loads the configuration and connects the database client (supabase_client) and the S3 bucket once.
         """
         if not self.__initialized:
             self.config = self.__get_config()
-
-            self.session_id = session_id
-            self.interview_id = interview_id
-
-            # S3 Folders
-            self.output_s3_folder = '{}/{}/output'.format(self.session_id, self.interview_id)
-
-            # Create loggers
-            self.log = self.__init_logs()
-            self.log.propagate = False
+            self.log = logging.getLogger('audioLog')
 
             self.supabase_client = self.__check_supabase_connection()
             self.supabase_connection = self.__connect_to_bucket()
@@ -87,35 +40,6 @@ class Utils:
 
             self.__initialized = True
 
-    def __del__(self):
-        self.__initialized = False
-
-    def __init_logs(self) -> logging.Logger:
-        """
-        Initializes and configures logging for the application. This method sets up separate log handlers
-        for INFO and ERROR level messages to ensure logs are captured appropriately.
-        Returns:
-            logging.Logger: The configured root logger with handlers for INFO and ERROR logs.
-        Functionality:
-            - Sets logging level to INFO for general logs.
-            - Configures formatters to include timestamp, log level, and message details.
-            - Creates separate file handlers for INFO and ERROR logs with buffering capabilities.
-        """
-        logger = logging.getLogger('audioLog')
-        logger.setLevel(logging.INFO)
-
-        # Create a file handler for INFO messages
-        handler = BufferingHandler('audioLog_{}'.format(datetime.now().strftime('%Y_%m_%d_%H.%M.%S')))
-        handler.setLevel(logging.INFO)
-        handler.setFormatter(logging.Formatter(
-            '[%(asctime)s] %(levelname)s [%(name)s.%(funcName)s:%(lineno)d] %(message)s'))
-
-        # Add the handlers to the root logger
-        logger.addHandler(handler)
-        logger.datefmt = '%d/%b/%Y %H:%M:%S'
-        logger.encoding = 'utf-8'
-        return logger
-
     def __get_config(self) -> configparser.ConfigParser:
         """
         Loads and returns the configuration settings from a 'config.ini' file. This method ensures that the application
@@ -180,29 +104,106 @@ class Utils:
             sys.exit(1)
         return connection
 
+
+class Utils:
+    """
+    Provides utility functions and classes for logging, configuration management, and interaction with cloud storage.
+    A Utils instance is created for each request and holds its session, interview and logging state, while the
+    configuration and the Supabase clients are shared through Connections.
+    """
+    def __init__(self, session_id: int, interview_id: int) -> None:
+        """
+        Parameters:
+            session_id (int)
+            interview_id (int)
+        Functionality:
+            Initializes logging for the request and gets the shared configuration and database clients.
+        """
+        connections = Connections()
+        self.config = connections.config
+        self.supabase_client = connections.supabase_client
+        self.supabase_connection = connections.supabase_connection
+        self.supabase: Client = connections.supabase
+
+        self.session_id = session_id
+        self.interview_id = interview_id
+
+        # S3 Folders
+        self.output_s3_folder = '{}/{}/output'.format(self.session_id, self.interview_id)
+
+        # Create loggers
+        self.log_handler, self.log = self.__init_logs()
+
+    def __init_logs(self) -> Tuple[RequestLogHandler, RequestLogger]:
+        """
+        Initializes and configures logging for the current request. Records are tagged with a request identifier
+        and kept by a dedicated handler, so that concurrent requests sharing the 'audioLog' logger do not mix
+        their records.
+        Returns:
+            Tuple[RequestLogHandler, RequestLogger]: The handler buffering the records of the request, and the
+                                                     logger to use for the request.
+        Functionality:
+            - Sets logging level to INFO for general logs.
+            - Creates a handler keeping the structured records of the request in a bounded ring buffer.
+        """
+        logger = logging.getLogger('audioLog')
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+
+        request_id = uuid.uuid4().hex
+        capacity = self.config.getint('LOGS', 'Capacity', fallback=10000)
+
+        # Create a handler for the records of this request
+        handler = RequestLogHandler('audioLog_{}_{}.jsonl.gz'.format(datetime.now().strftime('%Y_%m_%d_%H.%M.%S'),
+                                                                     request_id[:8]),
+                                    request_id,
+                                    capacity)
+        handler.setLevel(logging.INFO)
+
+        # Add the handler to the shared logger
+        logger.addHandler(handler)
+        return handler, RequestLogger(logger, {'request_id': request_id})
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """
+        Measures the duration of a processing stage and logs it as structured fields. If the stage raises,
+        the record is flagged with 'failed': True and the exception is propagated.
+        Parameters:
+            name (str): The name of the stage.
+        """
+        start = time.perf_counter()
+        failed = False
+        try:
+            yield
+        except BaseException:
+            failed = True
+            raise
+        finally:
+            duration_ms = (time.perf_counter() - start) * 1000
+            fields = {'stage': name, 'duration_ms': round(duration_ms, 3)}
+            if failed:
+                fields['failed'] = True
+            # stacklevel skips this generator and contextlib, so the record points to the caller of stage()
+            self.log.info('Stage {} {} {:.1f} ms'.format(name, 'failed after' if failed else 'finished in',
+                                                         duration_ms),
+                          extra={'fields': fields},
+                          stacklevel=3)
+
     def end_log(self) -> None:
         """
         Functionality:
-            Flushes buffered logs to a file and uploads it to S3.
-            Ends logging for the session.
+            Compresses the buffered logs of the request and queues their upload to S3 on a background thread.
+            Ends logging for the request, later calls do nothing.
         """
-        log_handlers = logging.getLogger('audioLog').handlers[:]
-        print('Audio analysis finished. Saving {} log'.format(len(log_handlers)))
-        for handler in log_handlers:
-            if isinstance(handler, BufferingHandler):
-                log = handler.flush()
-                if log:
-                    s3_path = '{}/{}/logs/{}'.format(self.session_id, self.interview_id, handler.filename)
-                    try:
-                        self.supabase_connection.upload(file=log.encode(),
-                                                        path=s3_path,
-                                                        file_options={'content-type': 'text/plain'}
-                                                        )
-                        self.log.info('Log file {} uploaded to S3 bucket'.format(handler.filename))
-                    except Exception as e:
-                        self.log.error('Error uploading the file {} to the S3 bucket : {}.'.
-                                       format(handler.filename, str(e)))
-            logging.getLogger('audioLog').removeHandler(handler)
+        handler = self.log_handler
+        if handler is None:
+            return
+        self.log_handler = None
+        logging.getLogger('audioLog').removeHandler(handler)
+        print('Audio analysis finished. Saving log {}'.format(handler.filename))
+        s3_path = '{}/{}/logs/{}'.format(self.session_id, self.interview_id, handler.filename)
+        log_uploader.submit(self.supabase_connection, s3_path, handler)
 
     def get_segments_from_db(self) -> pd.DataFrame | None:
         """